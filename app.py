@@ -1,8 +1,9 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, g
 import sqlite3
 import os
 from datetime import datetime
 from functools import wraps
+from profiler import profiler, ConexaoMedida
 
 app = Flask(__name__)
 app.secret_key = 'sistema_manutencao_secret_key'
@@ -11,7 +12,11 @@ app.secret_key = 'sistema_manutencao_secret_key'
 DATABASE = 'sistema_manutencao.db'
 
 def get_db_connection():
-    conn = sqlite3.connect(DATABASE)
+    # Durante uma janela de profiling as consultas são cronometradas
+    if profiler.ativo:
+        conn = sqlite3.connect(DATABASE, factory=ConexaoMedida)
+    else:
+        conn = sqlite3.connect(DATABASE)
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -33,6 +38,27 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Função decoradora para restringir o acesso a administradores
+def admin_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if session.get('tipo') != 'admin':
+            return jsonify({'erro': 'Acesso restrito a administradores.'}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
+# Profiler sob demanda: sem custo enquanto desativado
+@app.before_request
+def iniciar_profiling():
+    if profiler.ativo and profiler.deve_perfilar(request.endpoint):
+        g.perfilando = profiler.requisicao_iniciada(request.endpoint)
+
+@app.teardown_request
+def finalizar_profiling(exc=None):
+    # Fecha a contabilidade mesmo se a janela terminou durante a requisição
+    if g.get('perfilando'):
+        profiler.requisicao_finalizada()
+
 # Rotas
 @app.route('/')
 def index():
@@ -237,6 +263,36 @@ def estoque():
     conn.close()
     return render_template('estoque.html', itens=itens)
 
+@app.route('/admin/profiler', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def admin_profiler():
+    if request.method == 'POST':
+        dados = request.get_json(silent=True) or request.form
+        acao = dados.get('acao', 'iniciar')
+        if acao == 'parar':
+            profiler.parar()
+        else:
+            try:
+                segundos = float(dados.get('segundos', 10))
+            except (TypeError, ValueError):
+                return jsonify({'erro': 'Valor inválido para segundos.'}), 400
+            endpoint = dados.get('endpoint') or None
+            if endpoint is not None and endpoint not in app.view_functions:
+                return jsonify({'erro': f'Rota desconhecida: {endpoint}'}), 400
+            if not profiler.iniciar(segundos, endpoint):
+                return jsonify({'erro': 'O profiler já está ativo neste worker.'}), 409
+    relatorio = profiler.relatorio(incluir_collapsed=True)
+    relatorio['worker_pid'] = os.getpid()
+    return jsonify(relatorio)
+
+@app.route('/admin/profiler/collapsed')
+@login_required
+@admin_required
+def admin_profiler_collapsed():
+    # Saída no formato "collapsed stack" para flamegraph.pl ou speedscope
+    return Response(profiler.collapsed(), mimetype='text/plain')
+
 # Inicializar o banco de dados antes de iniciar o servidor
 init_db()
 
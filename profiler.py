@@ -0,0 +1,225 @@
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Limites de segurança para uso em produção
+DURACAO_MAXIMA = 120       # segundos
+INTERVALO_PADRAO = 0.005   # 5ms entre amostras
+PROFUNDIDADE_MAXIMA = 64   # quadros por pilha
+
+# Rotas do próprio profiler não entram no relatório
+ENDPOINTS_IGNORADOS = {'admin_profiler', 'admin_profiler_collapsed'}
+
+
+class SamplingProfiler:
+    """Profiler por amostragem que roda dentro do worker sob demanda.
+
+    Enquanto desativado, o único custo por requisição é a leitura do
+    atributo ``ativo``. Quando ativado, uma thread em segundo plano lê as
+    pilhas das threads que estão atendendo requisições e agrega tudo em
+    formato "collapsed stack" (compatível com flamegraph.pl e speedscope).
+    """
+
+    def __init__(self):
+        self.ativo = False
+        self._lock = threading.Lock()
+        self._thread = None
+        self._parar = threading.Event()
+        self._resetar()
+
+    def _resetar(self):
+        self.endpoint = None
+        self.intervalo = INTERVALO_PADRAO
+        self.inicio = None
+        self.fim = None
+        self.amostras = 0
+        self.pilhas = Counter()
+        self.tempo_requisicoes = 0.0
+        self.total_requisicoes = 0
+        self.sql = defaultdict(lambda: {'quantidade': 0, 'tempo': 0.0})
+        # thread_id -> requisição em andamento (endpoint, início e SQL próprio)
+        self._requisicoes = {}
+
+    def iniciar(self, segundos, endpoint=None, intervalo=INTERVALO_PADRAO):
+        segundos = max(0.1, min(float(segundos), DURACAO_MAXIMA))
+        intervalo = max(0.001, min(float(intervalo), 1.0))
+        with self._lock:
+            if self.ativo:
+                return False
+            self._resetar()
+            self.endpoint = endpoint or None
+            self.intervalo = intervalo
+            self.inicio = time.time()
+            self.fim = self.inicio + segundos
+            self._parar.clear()
+            self.ativo = True
+            self._thread = threading.Thread(target=self._amostrar, name='sampling-profiler', daemon=True)
+            self._thread.start()
+        return True
+
+    def parar(self):
+        self._parar.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=2)
+
+    def _desativar(self):
+        # Requisições em andamento continuam registradas para fechar a
+        # própria contabilidade em requisicao_finalizada
+        with self._lock:
+            self.ativo = False
+            self.fim = min(self.fim, time.time())
+
+    def _amostrar(self):
+        proprio = threading.get_ident()
+        try:
+            while not self._parar.is_set() and time.time() < self.fim:
+                with self._lock:
+                    alvos = {thread_id: req['endpoint'] for thread_id, req in self._requisicoes.items()}
+                if alvos:
+                    frames = sys._current_frames()
+                    for thread_id, endpoint in alvos.items():
+                        frame = frames.get(thread_id)
+                        if frame is None or thread_id == proprio:
+                            continue
+                        pilha = self._colapsar(frame, endpoint)
+                        with self._lock:
+                            self.pilhas[pilha] += 1
+                            self.amostras += 1
+                    del frames
+                self._parar.wait(self.intervalo)
+        finally:
+            self._desativar()
+
+    @staticmethod
+    def _colapsar(frame, endpoint):
+        quadros = []
+        while frame is not None:
+            code = frame.f_code
+            quadros.append('%s (%s:%d)' % (code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        quadros.reverse()
+        # Mantém os quadros mais externos para que a raiz seja sempre a mesma;
+        # pilhas cortadas terminam com "..."
+        if len(quadros) > PROFUNDIDADE_MAXIMA:
+            quadros = quadros[:PROFUNDIDADE_MAXIMA] + ['...']
+        quadros.insert(0, endpoint or '?')
+        return ';'.join(q.replace(';', ':') for q in quadros)
+
+    # Ganchos de requisição
+    def deve_perfilar(self, endpoint):
+        if not self.ativo or endpoint in ENDPOINTS_IGNORADOS:
+            return False
+        return self.endpoint is None or self.endpoint == endpoint
+
+    def requisicao_iniciada(self, endpoint):
+        with self._lock:
+            if not self.ativo:
+                return False
+            self._requisicoes[threading.get_ident()] = {
+                'endpoint': endpoint,
+                'inicio': time.perf_counter(),
+                'sql': defaultdict(lambda: {'quantidade': 0, 'tempo': 0.0}),
+            }
+        return True
+
+    def requisicao_finalizada(self):
+        with self._lock:
+            req = self._requisicoes.pop(threading.get_ident(), None)
+            if req is None:
+                return
+            self.tempo_requisicoes += time.perf_counter() - req['inicio']
+            self.total_requisicoes += 1
+            for chave, estatistica in req['sql'].items():
+                total = self.sql[chave]
+                total['quantidade'] += estatistica['quantidade']
+                total['tempo'] += estatistica['tempo']
+
+    def registrar_sql(self, sql, duracao, nova=True):
+        # O tempo fica na requisição e só entra nos totais quando ela termina,
+        # assim o tempo de SQL nunca ultrapassa o tempo das requisições
+        req = self._requisicoes.get(threading.get_ident())
+        if req is None:
+            return
+        estatistica = req['sql'][' '.join(sql.split())[:200]]
+        if nova:
+            estatistica['quantidade'] += 1
+        estatistica['tempo'] += duracao
+
+    # Resultados
+    def _collapsed(self):
+        pilhas = sorted(self.pilhas.items(), key=lambda item: -item[1])
+        return '\n'.join('%s %d' % (pilha, total) for pilha, total in pilhas) + '\n'
+
+    def collapsed(self):
+        with self._lock:
+            return self._collapsed()
+
+    def relatorio(self, incluir_collapsed=False):
+        with self._lock:
+            tempo_sql = sum(s['tempo'] for s in self.sql.values())
+            consultas = sorted(
+                ({'sql': sql, 'quantidade': s['quantidade'], 'tempo_ms': round(s['tempo'] * 1000, 3)}
+                 for sql, s in self.sql.items()),
+                key=lambda c: -c['tempo_ms'])
+            relatorio = {
+                'ativo': self.ativo,
+                'endpoint': self.endpoint,
+                'intervalo_ms': self.intervalo * 1000,
+                'inicio': self.inicio,
+                'fim': self.fim,
+                'amostras': self.amostras,
+                'requisicoes': self.total_requisicoes,
+                'em_andamento': len(self._requisicoes),
+                'tempo_requisicoes_ms': round(self.tempo_requisicoes * 1000, 3),
+                'tempo_sql_ms': round(tempo_sql * 1000, 3),
+                'tempo_python_ms': round((self.tempo_requisicoes - tempo_sql) * 1000, 3),
+                'consultas': consultas,
+            }
+            if incluir_collapsed:
+                relatorio['collapsed'] = self._collapsed()
+            return relatorio
+
+
+profiler = SamplingProfiler()
+
+
+# Conexão SQLite que mede o tempo de cada consulta (usada só durante a janela)
+class CursorMedido(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        self._sql = sql
+        inicio = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            profiler.registrar_sql(sql, time.perf_counter() - inicio)
+
+    def _medir(self, metodo, *args):
+        # Leitura de linhas soma tempo à consulta sem contar uma nova execução
+        inicio = time.perf_counter()
+        try:
+            return metodo(*args)
+        finally:
+            profiler.registrar_sql(getattr(self, '_sql', '?'), time.perf_counter() - inicio, nova=False)
+
+    def __next__(self):
+        return self._medir(super().__next__)
+
+    def fetchone(self):
+        return self._medir(super().fetchone)
+
+    def fetchmany(self, size=None):
+        return self._medir(super().fetchmany, size if size is not None else self.arraysize)
+
+    def fetchall(self):
+        return self._medir(super().fetchall)
+
+
+class ConexaoMedida(sqlite3.Connection):
+    def cursor(self, factory=CursorMedido):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)